@@ -1,71 +1,362 @@
 import yfinance as yf
+import pandas as pd
 from sec_api import QueryApi
 from newsapi import NewsApiClient
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
-import time
-import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import asyncio
+import functools
+import warnings
 from knowledge_graph.graph_interface import MarketGraphDB
+from data_ingestion.resilience import retry, yahoo_breaker, neo4j_breaker
+
+try:
+    from yfinance.exceptions import YFRateLimitError
+except ImportError:  # older yfinance reports throttling as an empty frame
+    YFRateLimitError = None
+
+class EmptyHistoryError(ValueError):
+    """Raised when Yahoo returns no price rows for a request"""
+
+# yfinance sends requests through curl_cffi or requests; both raise
+# OSError subclasses for network failures. These count against the breaker.
+_YAHOO_TRIP_ERRORS = tuple(e for e in (YFRateLimitError, OSError) if e is not None)
+# yfinance also swallows most failures and returns an empty frame, so that
+# is retried too, without counting against the breaker on its own
+_YAHOO_RETRY_ERRORS = _YAHOO_TRIP_ERRORS + (EmptyHistoryError,)
+
+def parse_dates(values, fmt: str = "%Y-%m-%d") -> pd.DatetimeIndex:
+    """Parse date strings in one vectorized call
+
+    An explicit format keeps pandas off its per-element dateutil fallback;
+    unparseable values become NaT.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        return pd.DatetimeIndex(pd.to_datetime(values, format=fmt, errors='coerce'))
 
 class MarketDataIngestion:
+    _MERGE_COMPANY_CYPHER = """
+    MERGE (c:Company {ticker: $ticker})
+    SET c.name = $name, c.sector = $sector
+    """
+
+    # Deleting in batches keeps server heap bounded on long histories;
+    # CALL ... IN TRANSACTIONS must run as an auto-commit query
+    _DELETE_PRICES_CYPHER = """
+    MATCH (c:Company {ticker: $ticker})-[:HAS_PRICE]->(p:PricePoint)
+    CALL { WITH p DETACH DELETE p } IN TRANSACTIONS OF 5000 ROWS
+    """
+
+    # Kept as one constant so every batch sends identical text and reuses
+    # the cached query plan
+    _INGEST_PRICES_CYPHER = """
+    UNWIND $rows AS r
+    MATCH (c:Company {ticker: $ticker})
+    CREATE (p:PricePoint {
+        ticker: $ticker,
+        date: datetime({epochMillis: r.date}),
+        open: r.open,
+        close: r.close,
+        volume: r.volume
+    })
+    CREATE (c)-[:HAS_PRICE]->(p)
+    """
+
     def __init__(self, graph_db: MarketGraphDB):
         self.graph_db = graph_db
         self.news_api = NewsApiClient(api_key=os.getenv("NEWS_API_KEY"))
         self.sec_api = QueryApi(api_key=os.getenv("SEC_API_KEY"))
-        self.retry_attempts = 3
-        self.retry_delay = 5  # seconds
+        self.batch_size = 20000  # rows per UNWIND write
+        self.download_chunk_size = 10  # symbols per yfinance request
+        self.max_workers = 8
 
     def ingest_stock_data(self, symbol: str, period: str = "1y"):
         """Ingest historical stock data with error handling and retries"""
-        for attempt in range(self.retry_attempts):
+        try:
+            hist = self._fetch_history(symbol)
+            self._write_stock_data(symbol, hist, self._fetch_company_info(symbol))
+            return True
+        except Exception as e:
+            print(f"Failed to ingest {symbol}: {e}")
+            raise
+
+    def ingest_stock_data_batch(self, symbols: List[str], start: str = "2023-08-01",
+                                end: str = "2023-10-01") -> Dict[str, Optional[Exception]]:
+        """Ingest several tickers from batched yfinance downloads
+
+        Prices for up to `download_chunk_size` symbols are fetched in one
+        request, then written per ticker concurrently.
+
+        Returns:
+            Mapping of symbol to the exception raised while ingesting it,
+            or None on success
+        """
+        results = {}
+        for i in range(0, len(symbols), self.download_chunk_size):
+            chunk = symbols[i:i + self.download_chunk_size]
             try:
-                stock = yf.Ticker(symbol)
-                hist = stock.history(
-                    start="2023-08-01",  # Start before iPhone event
-                    end="2023-10-01"     # End after iPhone event
-                )
-                if hist.empty:
-                    raise ValueError(f"No data returned for {symbol}")
-                    
-                # Create company node if doesn't exist
-                company_info = stock.info
-                self.graph_db.query("""
-                MERGE (c:Company {ticker: $ticker})
-                SET c.name = $name, c.sector = $sector
-                """, {"ticker": symbol, "name": company_info.get('longName', symbol), 
-                      "sector": company_info.get('sector', 'Unknown')})
-                
-                # First, delete existing price nodes to avoid duplicates
-                self.graph_db.query("""
-                MATCH (c:Company {ticker: $ticker})-[r:HAS_PRICE]->(p:PricePoint)
-                DELETE r, p
-                """, {"ticker": symbol})
-                
-                # Create price nodes and relationships
-                for date, row in hist.iterrows():
-                    self.graph_db.query("""
-                    MATCH (c:Company {ticker: $ticker})
-                    CREATE (p:PricePoint {
-                        date: datetime($date),
-                        open: $open,
-                        close: $close,
-                        volume: $volume
-                    })
-                    CREATE (c)-[:HAS_PRICE]->(p)
-                    """, {
-                        "ticker": symbol,
-                        "date": date.strftime("%Y-%m-%d"),
-                        "open": float(row['Open']),
-                        "close": float(row['Close']),
-                        "volume": int(row['Volume'])
-                    })
-                
-                return True
-                
+                df = self._download_history(chunk, start, end)
             except Exception as e:
-                if attempt == self.retry_attempts - 1:
-                    print(f"Failed to ingest {symbol} after {self.retry_attempts} attempts: {e}")
-                    raise
-                time.sleep(self.retry_delay) 
\ No newline at end of file
+                results.update({symbol: e for symbol in chunk})
+                continue
+
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunk))) as executor:
+                futures = {
+                    executor.submit(self._ingest_history, symbol, self._history_for(df, symbol)): symbol
+                    for symbol in chunk
+                }
+                for future in as_completed(futures):
+                    symbol = futures[future]
+                    try:
+                        future.result()
+                        results[symbol] = None
+                    except Exception as e:
+                        results[symbol] = e
+        return results
+
+    async def ingest_stock_data_async(self, symbol: str):
+        """Async variant of ingest_stock_data that writes over the async Neo4j driver"""
+        try:
+            hist = await asyncio.to_thread(self._fetch_history, symbol)
+            company_info = await asyncio.to_thread(self._fetch_company_info, symbol)
+            await self._write_stock_data_async(symbol, hist, company_info)
+            return True
+        except Exception as e:
+            print(f"Failed to ingest {symbol}: {e}")
+            raise
+
+    async def ingest_stock_data_batch_async(self, symbols: List[str], start: str = "2023-08-01",
+                                            end: str = "2023-10-01") -> Dict[str, Optional[Exception]]:
+        """Async variant of ingest_stock_data_batch
+
+        Writes for each downloaded chunk run as coroutines on one event loop
+        rather than occupying a worker thread per ticker while waiting on Bolt.
+        """
+        results = {}
+        for i in range(0, len(symbols), self.download_chunk_size):
+            chunk = symbols[i:i + self.download_chunk_size]
+            try:
+                df = await asyncio.to_thread(self._download_history, chunk, start, end)
+            except Exception as e:
+                results.update({symbol: e for symbol in chunk})
+                continue
+
+            outcomes = await asyncio.gather(
+                *(self._ingest_history_async(symbol, self._history_for(df, symbol)) for symbol in chunk),
+                return_exceptions=True
+            )
+            for symbol, outcome in zip(chunk, outcomes):
+                results[symbol] = outcome if isinstance(outcome, Exception) else None
+        return results
+
+    def ingest_correlations(self, symbols: List[str]) -> int:
+        """Precompute pairwise daily-return correlations and store them as edges
+
+        Each ticker's returns are taken over its own consecutive trading
+        days, then the full matrix is computed once with pandas over the
+        dates both tickers have a return for. The upper triangle is written
+        as CORRELATES_WITH relationships, with the overlap it was computed
+        over, so correlation analysis becomes a graph lookup.
+
+        Returns:
+            Number of correlation edges written
+        """
+        prices = self.graph_db.query("""
+        MATCH (p:PricePoint)
+        WHERE p.ticker IN $tickers
+        RETURN p.ticker as ticker, toString(date(p.date)) as date, p.close as close
+        """, {"tickers": symbols})
+        if not prices:
+            return 0
+
+        closes = pd.DataFrame(prices).pivot_table(index='date', columns='ticker', values='close')
+        returns = closes.apply(lambda col: col.dropna().pct_change())
+        corr = returns.corr()
+        present = returns.notna()
+        overlap = present.astype(int).T @ present.astype(int)
+
+        rows = []
+        tickers = list(corr.columns)
+        for i, a in enumerate(tickers):
+            for b in tickers[i + 1:]:
+                if pd.isna(corr.at[a, b]):
+                    continue
+                dates = returns.index[present[a] & present[b]]
+                rows.append({
+                    "source": a, "target": b, "coef": float(corr.at[a, b]),
+                    "data_points": int(overlap.at[a, b]), "start": dates[0], "end": dates[-1]
+                })
+        self._write_correlations(rows)
+        return len(rows)
+
+    @retry(breaker=neo4j_breaker)
+    def _write_correlations(self, rows: List[Dict]):
+        self.graph_db.write("""
+        UNWIND $rows AS r
+        MATCH (a:Company {ticker: r.source})
+        MATCH (b:Company {ticker: r.target})
+        MERGE (a)-[c:CORRELATES_WITH]->(b)
+        SET c.coef = r.coef, c.data_points = r.data_points,
+            c.start = date(r.start), c.end = date(r.end)
+        """, {"rows": rows})
+        self.graph_db.clear_cache()
+
+    def check_ingest_plan(self) -> bool:
+        """Check the schema the ingest and read paths rely on
+
+        EXPLAINs the price ingest query to confirm it seeks Company by
+        unique index, and confirms the price_ticker_date index exists:
+        get_price_history hints it, and a hinted query fails outright when
+        the index is missing.
+        """
+        indexes = self.graph_db.query(
+            "SHOW INDEXES YIELD name WHERE name = 'price_ticker_date' RETURN name"
+        )
+        if not indexes:
+            return False
+        summary = self.graph_db.write("EXPLAIN " + self._INGEST_PRICES_CYPHER, {"ticker": "", "rows": []})
+        operators = []
+        pending = [summary.plan] if summary.plan else []
+        while pending:
+            op = pending.pop()
+            operators.append(op.get('operatorType', ''))
+            pending.extend(op.get('children', []))
+        return any(op.startswith("NodeUniqueIndexSeek") for op in operators)
+
+    @staticmethod
+    def _history_for(df, symbol: str):
+        """Select one symbol's rows from a group_by='ticker' download"""
+        try:
+            return df[symbol].dropna()
+        except KeyError:
+            return df.iloc[0:0]
+
+    @retry(breaker=yahoo_breaker, retry_on=_YAHOO_RETRY_ERRORS, trip_on=_YAHOO_TRIP_ERRORS)
+    def _fetch_history(self, symbol: str):
+        """Fetch price history for a single symbol"""
+        hist = yf.Ticker(symbol).history(
+            start="2023-08-01",  # Start before iPhone event
+            end="2023-10-01"     # End after iPhone event
+        )
+        if hist.empty:
+            raise EmptyHistoryError(f"No data returned for {symbol}")
+        return hist
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    @retry(breaker=yahoo_breaker, retry_on=_YAHOO_RETRY_ERRORS, trip_on=_YAHOO_TRIP_ERRORS)
+    def _fetch_company_info(symbol: str) -> Dict:
+        """Fetch company metadata for a symbol
+
+        Cached for the life of the process: the info endpoint is slow and the
+        metadata does not change between write retries or re-ingests.
+        """
+        return yf.Ticker(symbol).info
+
+    @retry(breaker=yahoo_breaker, retry_on=_YAHOO_RETRY_ERRORS, trip_on=_YAHOO_TRIP_ERRORS)
+    def _download_history(self, symbols: List[str], start: str, end: str):
+        """Download price history for several symbols in a single request"""
+        df = yf.download(
+            " ".join(symbols),
+            start=start,
+            end=end,
+            group_by='ticker',
+            threads=True,
+            progress=False
+        )
+        # Per-symbol gaps are reported by _ingest_history; a wholly empty
+        # frame usually means the request itself failed
+        if df.dropna(how='all').empty:
+            raise EmptyHistoryError(f"No data returned for {', '.join(symbols)}")
+        return df
+
+    def _ingest_history(self, symbol: str, hist):
+        """Write an already downloaded price history for a symbol"""
+        if hist.empty:
+            raise ValueError(f"No data returned for {symbol}")
+        try:
+            self._write_stock_data(symbol, hist, self._fetch_company_info(symbol))
+            return True
+        except Exception as e:
+            print(f"Failed to ingest {symbol}: {e}")
+            raise
+
+    async def _ingest_history_async(self, symbol: str, hist):
+        """Async variant of _ingest_history"""
+        if hist.empty:
+            raise ValueError(f"No data returned for {symbol}")
+        try:
+            company_info = await asyncio.to_thread(self._fetch_company_info, symbol)
+            await self._write_stock_data_async(symbol, hist, company_info)
+            return True
+        except Exception as e:
+            print(f"Failed to ingest {symbol}: {e}")
+            raise
+
+    @staticmethod
+    def _price_rows(hist) -> List[Dict]:
+        """Convert a price history DataFrame into UNWIND rows"""
+        # Extract whole columns instead of boxing each row with iterrows
+        # Dates travel as epoch milliseconds so neither side parses strings.
+        # Ticker.history indexes by midnight in the exchange's timezone;
+        # dropping the zone keeps that wall-clock date (a UTC conversion would
+        # shift exchanges east of UTC to the previous day) and matches the
+        # tz-naive index yf.download returns.
+        index = hist.index
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        dates = index.as_unit('ms').asi8.tolist()
+        # Cast each column once; tolist() yields native Python scalars for Bolt
+        opens = hist['Open'].to_numpy(dtype='float64').tolist()
+        closes = hist['Close'].to_numpy(dtype='float64').tolist()
+        volumes = hist['Volume'].to_numpy(dtype='int64').tolist()
+        return [
+            {"date": d, "open": o, "close": c, "volume": v}
+            for d, o, c, v in zip(dates, opens, closes, volumes)
+        ]
+
+    @staticmethod
+    def _company_params(symbol: str, company_info: Dict) -> Dict:
+        return {"ticker": symbol, "name": company_info.get('longName', symbol),
+                "sector": company_info.get('sector', 'Unknown')}
+
+    @retry(breaker=neo4j_breaker)
+    def _write_stock_data(self, symbol: str, hist, company_info: Dict):
+        """Write company and price nodes for a symbol's price history"""
+        rows = self._price_rows(hist)
+
+        with self.graph_db.batch() as session:
+            # Create company node if doesn't exist
+            self.graph_db.write(self._MERGE_COMPANY_CYPHER, self._company_params(symbol, company_info), session)
+            
+            # First, delete existing price nodes to avoid duplicates
+            self.graph_db.write(self._DELETE_PRICES_CYPHER, {"ticker": symbol}, session)
+            
+            # Create price nodes and relationships, one transaction per batch
+            for i in range(0, len(rows), self.batch_size):
+                session.execute_write(self._create_price_points, symbol, rows[i:i + self.batch_size])
+        self.graph_db.clear_cache()
+
+    @retry(breaker=neo4j_breaker)
+    async def _write_stock_data_async(self, symbol: str, hist, company_info: Dict):
+        """Async variant of _write_stock_data"""
+        rows = self._price_rows(hist)
+
+        async with self.graph_db.abatch() as session:
+            await self.graph_db.awrite(self._MERGE_COMPANY_CYPHER, self._company_params(symbol, company_info), session)
+            await self.graph_db.awrite(self._DELETE_PRICES_CYPHER, {"ticker": symbol}, session)
+            for i in range(0, len(rows), self.batch_size):
+                await session.execute_write(self._acreate_price_points, symbol, rows[i:i + self.batch_size])
+        self.graph_db.clear_cache()
+
+    @classmethod
+    def _create_price_points(cls, tx, symbol: str, rows: List[Dict]):
+        tx.run(cls._INGEST_PRICES_CYPHER, {"ticker": symbol, "rows": rows}).consume()
+
+    @classmethod
+    async def _acreate_price_points(cls, tx, symbol: str, rows: List[Dict]):
+        result = await tx.run(cls._INGEST_PRICES_CYPHER, {"ticker": symbol, "rows": rows})
+        await result.consume()
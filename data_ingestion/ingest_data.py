@@ -1,8 +1,16 @@
-from graph_builder import MarketDataIngestion
+from data_ingestion.graph_builder import MarketDataIngestion, parse_dates
 from knowledge_graph.graph_interface import MarketGraphDB
+from data_ingestion.resilience import retry, neo4j_breaker
 import os
+import asyncio
 from dotenv import load_dotenv
 
+@retry(breaker=neo4j_breaker)
+def _write(db, cypher, params):
+    summary = db.write(cypher, params)
+    db.clear_cache()
+    return summary
+
 def add_sample_relationships(db):
     """Add sample supply chain relationships"""
     relationships = [
@@ -13,20 +21,21 @@ def add_sample_relationships(db):
     ]
     
     print("\nAdding supply chain relationships...")
-    for source, target, rel_type, product in relationships:
-        try:
-            db.query("""
-            MATCH (s:Company {ticker: $source})
-            MATCH (t:Company {ticker: $target})
-            MERGE (s)-[:SUPPLIES {product: $product}]->(t)
-            """, {
-                "source": source,
-                "target": target,
-                "product": product
-            })
-            print(f"✅ Added relationship: {source} -> {target}")
-        except Exception as e:
-            print(f"❌ Failed to add relationship {source} -> {target}: {e}")
+    rows = [
+        {"source": source, "target": target, "product": product}
+        for source, target, rel_type, product in relationships
+    ]
+    try:
+        _write(db, """
+        UNWIND $rows AS r
+        MATCH (s:Company {ticker: r.source})
+        MATCH (t:Company {ticker: r.target})
+        MERGE (s)-[:SUPPLIES {product: r.product}]->(t)
+        """, {"rows": rows})
+        for row in rows:
+            print(f"✅ Added relationship: {row['source']} -> {row['target']}")
+    except Exception as e:
+        print(f"❌ Failed to add supply chain relationships: {e}")
 
 def add_sample_news(db):
     """Add sample news events"""
@@ -52,20 +61,45 @@ def add_sample_news(db):
     ]
     
     print("\nAdding sample news items...")
-    for news in news_items:
-        try:
-            db.query("""
-            MATCH (c:Company {ticker: $ticker})
-            CREATE (n:News {
-                date: datetime($date),
-                title: $title,
-                sentiment: $sentiment
-            })
-            CREATE (c)-[:HAS_NEWS]->(n)
-            """, news)
+    dates = parse_dates([news["date"] for news in news_items])
+    rows = [
+        {**news, "date": epoch_ms}
+        for news, epoch_ms, valid in zip(news_items, dates.as_unit('ms').asi8.tolist(), dates.notna())
+        if valid
+    ]
+    try:
+        _write(db, """
+        UNWIND $rows AS r
+        MATCH (c:Company {ticker: r.ticker})
+        CREATE (n:News {
+            date: datetime({epochMillis: r.date}),
+            title: r.title,
+            sentiment: r.sentiment
+        })
+        CREATE (c)-[:HAS_NEWS]->(n)
+        """, {"rows": rows})
+        for news in rows:
             print(f"✅ Added news for {news['ticker']}: {news['title']}")
+    except Exception as e:
+        print(f"❌ Failed to add news items: {e}")
+
+async def ingest_prices(db, ingestion, symbols):
+    """Ingest price data for all symbols, closing the async driver afterwards"""
+    try:
+        # Establish connections up front so concurrent writers don't all
+        # handshake against a cold pool at once. This only helps latency, so
+        # an outage is left for the per-ticker writes to report.
+        try:
+            await db.awarm_up(min(len(symbols), ingestion.download_chunk_size))
         except Exception as e:
-            print(f"❌ Failed to add news for {news['ticker']}: {e}")
+            print(f"⚠️ Could not warm up the Neo4j connection pool: {e}")
+        return await ingestion.ingest_stock_data_batch_async(
+            symbols,
+            start="2023-08-01",  # Start before iPhone event
+            end="2023-10-01"     # End after iPhone event
+        )
+    finally:
+        await db.aclose()
 
 def main():
     load_dotenv()
@@ -82,14 +116,28 @@ def main():
     
     # Ingest sample stocks
     symbols = ['AAPL', 'TSMC', 'QCOM', 'AVGO', 'SWKS']
+    try:
+        if not ingestion.check_ingest_plan():
+            print("⚠️ Schema indexes are missing or unused by the price ingest plan; run setup_schema.py")
+    except Exception as e:
+        print(f"⚠️ Could not check the price ingest plan: {e}")
     print("\nIngesting stock data...")
+    # Prices are downloaded in batched yfinance requests and written
+    # concurrently over the async Neo4j driver.
+    results = asyncio.run(ingest_prices(db, ingestion, symbols))
     for symbol in symbols:
-        try:
-            print(f"Processing {symbol}...")
-            ingestion.ingest_stock_data(symbol)
+        error = results.get(symbol)
+        if error is None:
             print(f"✅ Successfully ingested {symbol}")
-        except Exception as e:
-            print(f"❌ Failed to ingest {symbol}: {e}")
+        else:
+            print(f"❌ Failed to ingest {symbol}: {error}")
+    
+    print("\nPrecomputing price correlations...")
+    try:
+        count = ingestion.ingest_correlations(symbols)
+        print(f"✅ Stored {count} correlation relationships")
+    except Exception as e:
+        print(f"❌ Failed to compute correlations: {e}")
     
     # Add relationships and news
     add_sample_relationships(db)
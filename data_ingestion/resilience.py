@@ -0,0 +1,153 @@
+import asyncio
+import functools
+import inspect
+import random
+import threading
+import time
+from collections import deque
+import requests
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is short-circuited by an open circuit breaker"""
+
+class CircuitBreaker:
+    """Stop calling an endpoint after repeated failures
+
+    The breaker opens once `failure_threshold` failures happen within `window`
+    seconds. While open every call fails fast; after `reset_timeout` seconds a
+    single trial call is let through (half open) and its outcome decides
+    whether the breaker closes again or re-opens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, window: float = 60.0,
+                 reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = deque()
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return
+            raise CircuitOpenError(f"Circuit for {self.name} is open; skipping call")
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures.clear()
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window:
+                self._failures.popleft()
+            if self.state == self.HALF_OPEN or len(self._failures) >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = now
+
+    def release(self):
+        """End a call whose outcome says nothing about the endpoint's health"""
+        with self._lock:
+            # A half-open trial that failed for an unrelated reason lets the
+            # next call try again instead of leaving the breaker stuck
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+# Errors worth retrying: the endpoint was unreachable or asked us to back off.
+# Anything else is deterministic and would fail the same way again.
+TRANSIENT_ERRORS = (
+    ServiceUnavailable,
+    SessionExpired,
+    TransientError,
+    requests.ConnectionError,
+    requests.Timeout
+)
+
+def retry(max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 10.0,
+          jitter: bool = True, breaker: CircuitBreaker = None,
+          retry_on: tuple = TRANSIENT_ERRORS, trip_on: tuple = None):
+    """Retry a function with exponential backoff, optionally behind a circuit breaker
+
+    Only exceptions in `retry_on` are retried; any other exception is
+    re-raised immediately. Of the retried exceptions, those in `trip_on`
+    (default: all of `retry_on`) count against the breaker.
+    """
+    if trip_on is None:
+        trip_on = retry_on
+
+    def record(exc: BaseException):
+        if breaker is None:
+            return
+        if isinstance(exc, trip_on):
+            breaker.record_failure()
+        else:
+            breaker.release()
+
+    def backoff(attempt: int) -> float:
+        delay = min(max_delay, base_delay * 2 ** attempt)
+        return random.uniform(0, delay) if jitter else delay
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                for attempt in range(max_attempts):
+                    if breaker is not None:
+                        breaker.before_call()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except retry_on as exc:
+                        record(exc)
+                        if attempt == max_attempts - 1:
+                            raise
+                        await asyncio.sleep(backoff(attempt))
+                    except BaseException:
+                        if breaker is not None:
+                            breaker.release()
+                        raise
+                    else:
+                        if breaker is not None:
+                            breaker.record_success()
+                        return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_attempts):
+                if breaker is not None:
+                    breaker.before_call()
+                try:
+                    result = func(*args, **kwargs)
+                except retry_on as exc:
+                    record(exc)
+                    if attempt == max_attempts - 1:
+                        raise
+                    time.sleep(backoff(attempt))
+                except BaseException:
+                    if breaker is not None:
+                        breaker.release()
+                    raise
+                else:
+                    if breaker is not None:
+                        breaker.record_success()
+                    return result
+        return wrapper
+    return decorator
+
+# Shared per-endpoint breakers so concurrent ingest workers back off together
+yahoo_breaker = CircuitBreaker("yahoo")
+neo4j_breaker = CircuitBreaker("neo4j")
@@ -10,6 +10,7 @@ def setup_schema(db: MarketGraphDB):
         "CREATE CONSTRAINT company_ticker IF NOT EXISTS FOR (c:Company) REQUIRE c.ticker IS UNIQUE",
         "CREATE CONSTRAINT news_id IF NOT EXISTS FOR (n:News) REQUIRE n.id IS UNIQUE",
         "CREATE INDEX price_date IF NOT EXISTS FOR (p:PricePoint) ON (p.date)",
+        "CREATE INDEX price_ticker_date IF NOT EXISTS FOR (p:PricePoint) ON (p.ticker, p.date)",
     ]
     
     # Create relationship indices
@@ -18,11 +19,25 @@ def setup_schema(db: MarketGraphDB):
         "CREATE INDEX has_news IF NOT EXISTS FOR ()-[r:HAS_NEWS]->() ON (r.date)"
     ]
     
-    for query in constraints + indices:
-        try:
-            db.query(query)
-        except Exception as e:
-            print(f"Error creating schema: {e}")
+    queries = constraints + indices
+
+    def create_all(tx):
+        for query in queries:
+            tx.run(query).consume()
+
+    try:
+        with db.batch() as session:
+            session.execute_write(create_all)
+    except Exception as e:
+        # A failing statement aborts the whole transaction, so fall back to
+        # applying each one on its own to report which failed
+        print(f"Batched schema setup failed ({e}); applying statements individually")
+        with db.batch() as session:
+            for query in queries:
+                try:
+                    db.write(query, session=session)
+                except Exception as e:
+                    print(f"Error creating schema: {e}")
 
 def main():
     load_dotenv()
@@ -2,11 +2,13 @@
 from crewai import Agent, Task, Crew, Process
 from knowledge_graph.query_tools import MarketQueryTool
 import os
+import logging
 from dotenv import load_dotenv
 
 load_dotenv()
 
 def main():
+    logging.basicConfig(level=logging.INFO)
     market_analyst = Agent(
         role="Financial Market Analyst",
         goal="Analyze market patterns and relationships to answer complex questions",
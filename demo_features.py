@@ -1,6 +1,7 @@
 from knowledge_graph.query_tools import MarketQueryTool
 from knowledge_graph.graph_interface import MarketGraphDB
 import os
+import logging
 from dotenv import load_dotenv
 import time
 
@@ -35,12 +36,12 @@ def demo_features():
     
     # 2. Price Correlation
     print_section("2. Price Correlation Analysis")
-    print("Analyzing correlation between Apple and Qualcomm...")
+    print("Analyzing daily-return correlation between Apple and Qualcomm...")
     corr = tool._analyze_correlation("AAPL", "QCOM", "1y")
     print("\nCorrelation Results:")
     for c in corr:
         print(f"- Correlation coefficient: {c['correlation_coefficient']:.2f}")
-        print(f"- Period: {c['period']}")
+        print(f"- Period: {c['start']} to {c['end']}")
         print(f"- Data points: {c['data_points']}")
     time.sleep(1)
     
@@ -108,6 +109,7 @@ def demo_features():
         print("No impact data found - check if we have price data for this date range")
 
 def main():
+    logging.basicConfig(level=logging.INFO)
     try:
         print("\nStarting Market Intelligence System Feature Demo...")
         print("Connecting to Neo4j database and initializing tools...")
@@ -0,0 +1,96 @@
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; fall back to vectorized NumPy
+    njit = None
+    prange = range
+
+def _prefix_sums(a: np.ndarray, b: np.ndarray):
+    # Center first so the running sums of squares don't lose precision
+    a = a - a.mean()
+    b = b - b.mean()
+    zero = np.zeros(1)
+    return (
+        np.concatenate((zero, np.cumsum(a))),
+        np.concatenate((zero, np.cumsum(b))),
+        np.concatenate((zero, np.cumsum(a * a))),
+        np.concatenate((zero, np.cumsum(b * b))),
+        np.concatenate((zero, np.cumsum(a * b)))
+    )
+
+def _rolling_pearson_numpy(a: np.ndarray, b: np.ndarray, window: int) -> np.ndarray:
+    sa, sb, saa, sbb, sab = _prefix_sums(a, b)
+    win_a = sa[window:] - sa[:-window]
+    win_b = sb[window:] - sb[:-window]
+    cov = (sab[window:] - sab[:-window]) - win_a * win_b / window
+    var_a = (saa[window:] - saa[:-window]) - win_a * win_a / window
+    var_b = (sbb[window:] - sbb[:-window]) - win_b * win_b / window
+    denominator = np.sqrt(np.clip(var_a, 0, None) * np.clip(var_b, 0, None))
+    out = np.zeros_like(cov)
+    np.divide(cov, denominator, out=out, where=denominator > 0)
+    return out
+
+def _rolling_pearson_loops(a, b, window):
+    n = a.shape[0]
+    a = a - a.mean()
+    b = b - b.mean()
+    sa = np.zeros(n + 1)
+    sb = np.zeros(n + 1)
+    saa = np.zeros(n + 1)
+    sbb = np.zeros(n + 1)
+    sab = np.zeros(n + 1)
+    for i in range(n):
+        sa[i + 1] = sa[i] + a[i]
+        sb[i + 1] = sb[i] + b[i]
+        saa[i + 1] = saa[i] + a[i] * a[i]
+        sbb[i + 1] = sbb[i] + b[i] * b[i]
+        sab[i + 1] = sab[i] + a[i] * b[i]
+
+    out = np.empty(n - window + 1)
+    for i in prange(n - window + 1):
+        j = i + window
+        win_a = sa[j] - sa[i]
+        win_b = sb[j] - sb[i]
+        cov = (sab[j] - sab[i]) - win_a * win_b / window
+        var_a = max((saa[j] - saa[i]) - win_a * win_a / window, 0.0)
+        var_b = max((sbb[j] - sbb[i]) - win_b * win_b / window, 0.0)
+        denominator = np.sqrt(var_a * var_b)
+        out[i] = cov / denominator if denominator > 0 else 0.0
+    return out
+
+def rolling_pearson(a: np.ndarray, b: np.ndarray, window: int) -> np.ndarray:
+    """Pearson coefficient over every sliding window of two equal-length series
+
+    Uses running sums so each window costs O(1) after one pass over the
+    data. Compiled with numba when it is installed and compiles cleanly.
+
+    Returns:
+        Array of length len(a) - window + 1
+    """
+    a = np.ascontiguousarray(a, dtype=np.float64)
+    b = np.ascontiguousarray(b, dtype=np.float64)
+    if a.shape != b.shape or a.ndim != 1:
+        raise ValueError("Series must be one-dimensional and of equal length")
+    if not 2 <= window <= len(a):
+        raise ValueError(f"Invalid window: {window}. Use a value between 2 and {len(a)}")
+    if _rolling_pearson_numba is not None:
+        return _rolling_pearson_numba(a, b, window)
+    return _rolling_pearson_numpy(a, b, window)
+
+def _compile():
+    """JIT-compile the loop kernel, or return None to use the NumPy version"""
+    if njit is None:
+        return None
+    try:
+        kernel = njit(cache=True, parallel=True)(_rolling_pearson_loops)
+        # Compile up front so the first real call doesn't pay the JIT cost
+        warm = np.arange(16, dtype=np.float64)
+        kernel(warm, warm[::-1].copy(), 4)
+        return kernel
+    except Exception:
+        # e.g. a stale on-disk cache from another numba version; importing
+        # this module must never fail because of the optional accelerator
+        return None
+
+_rolling_pearson_numba = _compile()
@@ -0,0 +1,77 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Hashable, Tuple
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+def _normalize(value: Any) -> Any:
+    """Strip whitespace from strings, including inside lists and tuples"""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, tuple)):
+        return type(value)(_normalize(v) for v in value)
+    return value
+
+def _hashable(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+def cached(method):
+    """Cache a MarketGraphDB read method in the instance's `_cache`
+
+    Arguments are normalized before both the lookup and the call, so the
+    query that fills an entry is the one its key describes. The key
+    includes today's date so rolling-window queries relative to "now" are
+    not served across a date rollover.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        args = tuple(_normalize(a) for a in args)
+        kwargs = {k: _normalize(v) for k, v in kwargs.items()}
+        key = (
+            method.__name__,
+            date.today().isoformat(),
+            _hashable(args),
+            tuple(sorted((k, _hashable(v)) for k, v in kwargs.items()))
+        )
+        hit, value = self._cache.get(key)
+        if hit:
+            return value
+        value = method(self, *args, **kwargs)
+        self._cache.set(key, value)
+        return value
+    return wrapper
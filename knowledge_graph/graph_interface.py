@@ -1,13 +1,22 @@
-from neo4j import GraphDatabase, Driver
-from typing import Dict, List, Any, Optional
+from neo4j import GraphDatabase, AsyncGraphDatabase, Driver, AsyncDriver, Session, AsyncSession, ResultSummary
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import numpy as np
 import pandas as pd
+from .cache import TTLCache, cached
 
 class MarketGraphDB:
     def __init__(self, uri: str, user: str, password: str):
         self._driver: Optional[Driver] = None
+        self._adriver: Optional[AsyncDriver] = None
         self._uri = uri
         self._user = user
         self._password = password
+        # Read results are reused for a few minutes; the graph only changes on
+        # ingest. Writers sharing this instance call clear_cache(); other
+        # processes see new data once their entries expire.
+        self._cache = TTLCache(maxsize=1024, ttl=300)
         
     @property
     def driver(self) -> Driver:
@@ -20,11 +29,36 @@ class MarketGraphDB:
                 connection_acquisition_timeout=60
             )
         return self._driver
+
+    @property
+    def adriver(self) -> AsyncDriver:
+        if self._adriver is None:
+            self._adriver = AsyncGraphDatabase.driver(
+                self._uri,
+                auth=(self._user, self._password),
+                max_connection_lifetime=3600,
+                max_connection_pool_size=50,
+                connection_acquisition_timeout=60
+            )
+        return self._adriver
         
     def close(self):
         if self._driver is not None:
             self._driver.close()
             self._driver = None
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    async def aclose(self):
+        if self._adriver is not None:
+            await self._adriver.close()
+            self._adriver = None
+            
+    async def awarm_up(self, connections: int = 8) -> None:
+        """Open pooled async connections ahead of a concurrent workload"""
+        await self.adriver.verify_connectivity()
+        await asyncio.gather(*(self.aquery("RETURN 1") for _ in range(connections)))
             
     def query(self, cypher: str, params: Dict = None) -> List[Dict]:
         try:
@@ -34,7 +68,62 @@ class MarketGraphDB:
         except Exception as e:
             print(f"Query failed: {e}")
             raise
-            
+
+    def write(self, cypher: str, params: Dict = None, session: Session = None) -> ResultSummary:
+        """Run a write query without materializing its records
+
+        Pass a session from batch() to reuse it; otherwise one is opened for
+        the call.
+        """
+        try:
+            if session is not None:
+                return session.run(cypher, params or {}).consume()
+            with self.driver.session() as session:
+                return session.run(cypher, params or {}).consume()
+        except Exception as e:
+            print(f"Query failed: {e}")
+            raise
+
+    async def aquery(self, cypher: str, params: Dict = None) -> List[Dict]:
+        try:
+            async with self.adriver.session() as session:
+                result = await session.run(cypher, params or {})
+                return [dict(record) async for record in result]
+        except Exception as e:
+            print(f"Query failed: {e}")
+            raise
+
+    async def awrite(self, cypher: str, params: Dict = None, session: AsyncSession = None) -> ResultSummary:
+        """Async variant of write; pass a session from abatch() to reuse it"""
+        try:
+            if session is not None:
+                result = await session.run(cypher, params or {})
+                return await result.consume()
+            async with self.adriver.session() as session:
+                result = await session.run(cypher, params or {})
+                return await result.consume()
+        except Exception as e:
+            print(f"Query failed: {e}")
+            raise
+
+    def iter_query(self, cypher: str, params: Dict = None) -> Iterator[Dict]:
+        """Yield records as they stream in instead of materializing a list"""
+        try:
+            with self.driver.session() as session:
+                for record in session.run(cypher, params or {}):
+                    yield dict(record)
+        except Exception as e:
+            print(f"Query failed: {e}")
+            raise
+
+    def batch(self) -> Session:
+        """Open a session to reuse across several statements of a bulk operation"""
+        return self.driver.session()
+
+    def abatch(self) -> AsyncSession:
+        """Async variant of batch"""
+        return self.adriver.session()
+
     def entity_search(self, query: str, entity_type: str = None) -> List[Dict]:
         """Semantic search for entities"""
         cypher = """
@@ -72,44 +161,96 @@ class MarketGraphDB:
 
     def get_entity_relationships(self, entity_id: str, depth: int = 2) -> Dict:
         """Get graph neighborhood around entity"""
-        cypher = """
+        # Cypher cannot parameterize variable-length bounds, so the depth is
+        # validated and formatted in as a literal
+        depth = int(depth)
+        if not 1 <= depth <= 4:
+            raise ValueError(f"Invalid depth: {depth}. Use a value between 1 and 4")
+        cypher = f"""
         MATCH path = (start)-[*1..{depth}]-(related)
         WHERE id(start) = $entity_id
         RETURN path
+        LIMIT 1000
         """
-        return self.query(cypher, {"entity_id": entity_id, "depth": depth})
+        return self.query(cypher, {"entity_id": entity_id})
 
-    def get_price_history(self, symbol: str, days: int = None, start_date: str = None, end_date: str = None) -> List[Dict]:
+    @cached
+    def get_price_history(self, symbol: str, days: int = None, start_date: str = None, end_date: str = None,
+                          event_date: str = None) -> List[Dict]:
         """Get historical price data for a symbol
         
         Args:
             symbol: Stock ticker
             days: Number of days of history (if using rolling window)
-            start_date: Start date in YYYY-MM-DD format (if using date range)
-            end_date: End date in YYYY-MM-DD format (if using date range)
+            start_date: Start date in YYYY-MM-DD format or a date (if using date range)
+            end_date: End date in YYYY-MM-DD format or a date (if using date range)
+            event_date: Date in YYYY-MM-DD format or a date to flag with
+                `is_event` (if using date range)
+
+        PricePoints carry their ticker, so the lookup uses the
+        (ticker, date) index instead of traversing HAS_PRICE. The date-range
+        form compares p.date directly and hints that index so the planner
+        always does an index range seek. The hint makes that form fail on a
+        database without the price_ticker_date index; run setup_schema.py
+        first.
         """
         if days:
             cypher = """
-            MATCH (c:Company {ticker: $ticker})-[:HAS_PRICE]->(p:PricePoint)
-            WHERE p.date >= datetime() - duration({days: $days})
+            MATCH (p:PricePoint)
+            WHERE p.ticker = $ticker
+              AND p.date >= datetime() - duration({days: $days})
             RETURN p.date as date, p.close as price, p.volume as volume, p.open as open
             ORDER BY p.date
             """
             return self.query(cypher, {"ticker": symbol, "days": days})
         else:
             cypher = """
-            MATCH (c:Company {ticker: $ticker})-[:HAS_PRICE]->(p:PricePoint)
-            WHERE date(p.date) >= date($start_date)
-              AND date(p.date) <= date($end_date)
-            RETURN p.date as date, p.close as price, p.volume as volume, p.open as open
+            MATCH (p:PricePoint)
+            USING INDEX p:PricePoint(ticker, date)
+            WHERE p.ticker = $ticker
+              AND p.date >= datetime({date: date($start_date)})
+              AND p.date < datetime({date: date($end_date)}) + duration({days: 1})
+            RETURN p.date as date, p.close as price, p.volume as volume, p.open as open,
+                   date(p.date) = date($event_date) as is_event
             ORDER BY p.date
             """
             return self.query(cypher, {
                 "ticker": symbol,
                 "start_date": start_date,
-                "end_date": end_date
+                "end_date": end_date,
+                "event_date": event_date
             })
 
+    @cached
+    def get_price_history_batch(self, tickers: List[str], days: int) -> Dict[str, List[Dict]]:
+        """Get rolling-window price history for several symbols in one query
+
+        Returns:
+            Mapping of ticker to its price history, shaped like
+            get_price_history; tickers without data map to an empty list
+        """
+        cypher = """
+        MATCH (p:PricePoint)
+        WHERE p.ticker IN $tickers
+          AND p.date >= datetime() - duration({days: $days})
+        WITH p ORDER BY p.date
+        RETURN p.ticker as ticker,
+               collect({date: p.date, price: p.close, volume: p.volume, open: p.open}) as history
+        """
+
+        def work(tx):
+            result = tx.run(cypher, {"tickers": tickers, "days": days})
+            return {record["ticker"]: record["history"] for record in result}
+
+        try:
+            with self.driver.session() as session:
+                histories = session.execute_read(work)
+        except Exception as e:
+            print(f"Query failed: {e}")
+            raise
+        return {ticker: histories.get(ticker, []) for ticker in tickers}
+
+    @cached
     def get_news_sentiment(self, ticker: str, days: int = 30) -> List[Dict]:
         """Get news sentiment data for a company"""
         cypher = """
@@ -120,6 +261,7 @@ class MarketGraphDB:
         """
         return self.query(cypher, {"ticker": ticker, "days": days})
 
+    @cached
     def get_supply_chain(self, ticker: str) -> List[Dict]:
         """Get supply chain relationships"""
         cypher = """
@@ -135,27 +277,64 @@ class MarketGraphDB:
     def get_correlated_stocks(self, symbol: str, min_correlation: float = 0.7) -> List[Dict]:
         """Find stocks with price correlation above threshold"""
         cypher = """
-        MATCH (c1:Company {ticker: $ticker})-[:CORRELATES_WITH]->(c2:Company)
-        WHERE c2.correlation_coefficient >= $min_correlation
-        RETURN c2.ticker, c2.correlation_coefficient
-        ORDER BY c2.correlation_coefficient DESC
+        MATCH (c1:Company {ticker: $ticker})-[r:CORRELATES_WITH]-(c2:Company)
+        WHERE r.coef >= $min_correlation
+        RETURN c2.ticker as ticker, r.coef as correlation_coefficient
+        ORDER BY r.coef DESC
         """
         return self.query(cypher, {"ticker": symbol, "min_correlation": min_correlation})
 
-    def get_correlation_data(self, symbol: str, timeframe: str = "1y") -> List[Dict]:
-        """Get price data for correlation analysis"""
+    @cached
+    def get_precomputed_correlation(self, symbol1: str, symbol2: str) -> Optional[Dict]:
+        """Get the correlation stored between two symbols at ingest time"""
+        cypher = """
+        MATCH (a:Company {ticker: $symbol1})-[r:CORRELATES_WITH]-(b:Company {ticker: $symbol2})
+        RETURN r.coef as coef, r.data_points as data_points,
+               toString(r.start) as start, toString(r.end) as end
+        LIMIT 1
+        """
+        result = self.query(cypher, {"symbol1": symbol1, "symbol2": symbol2})
+        return result[0] if result else None
+
+    @cached
+    def get_correlation_series(self, symbol: str, timeframe: str = "1y") -> Tuple[np.ndarray, np.ndarray]:
+        """Get (dates, closes) arrays for correlation analysis
+
+        Records are streamed straight into arrays, which are cached
+        read-only so repeat analyses skip both the query and the conversion.
+        """
+        dates, closes = [], []
+        for p in self.iter_correlation_data(symbol, timeframe):
+            dates.append(p['date'])
+            closes.append(p['price'])
+        dates, closes = np.array(dates, dtype=str), np.array(closes, dtype=np.float64)
+        dates.flags.writeable = False
+        closes.flags.writeable = False
+        return dates, closes
+
+    def iter_correlation_data(self, symbol: str, timeframe: str = "1y") -> Iterator[Dict]:
+        """Stream price data for correlation analysis
+        
+        Dates are trading days as YYYY-MM-DD strings, the same key ingest
+        uses to align tickers when precomputing correlations.
+        """
         cypher = """
         MATCH (c:Company {ticker: $ticker})-[:HAS_PRICE]->(p:PricePoint)
-        RETURN p.date as date, p.close as price
+        RETURN toString(date(p.date)) as date, p.close as price
         ORDER BY p.date
         """
-        return self.query(cypher, {"ticker": symbol})
+        return self.iter_query(cypher, {"ticker": symbol})
 
     def get_news_correlation(self, ticker: str, days: int) -> Dict:
-        """Get news and price data for correlation analysis"""
-        news = self.get_news_sentiment(ticker, days)
-        prices = self.get_price_history(ticker, days=days)
-        return {
-            'news': news,
-            'prices': prices
-        } 
\ No newline at end of file
+        """Get news and price data for correlation analysis
+
+        Not cached itself; both lookups it combines are.
+        """
+        # The two lookups are independent, so run them concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            news = executor.submit(self.get_news_sentiment, ticker, days)
+            prices = executor.submit(self.get_price_history, ticker, days=days)
+            return {
+                'news': news.result(),
+                'prices': prices.result()
+            } 
\ No newline at end of file
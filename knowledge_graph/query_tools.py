@@ -1,12 +1,107 @@
 from crewai.tools import BaseTool
-from typing import Optional, Dict, List
-from datetime import datetime, timedelta
+from typing import Callable, ClassVar, NamedTuple, Optional, Dict, List, Tuple, Type, Union
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from .graph_interface import MarketGraphDB
+from ._fastcorr import rolling_pearson
 import os
+import functools
 import logging
-from pydantic import Field, ConfigDict
+import re
+from pydantic import BaseModel, Field, ConfigDict, ValidationError, field_validator
 import numpy as np
 
+# "<command>: <params>" and comma separated "key=value" pairs
+_CMD_RE = re.compile(r'\s*(\w+)\s*:(.*)', re.DOTALL)
+_PARAM_RE = re.compile(r'(\w+)\s*=\s*([^,]+)')
+
+# Half-life, in articles, for recency-weighted news sentiment
+_SENTIMENT_HALF_LIFE = 5.0
+
+@functools.lru_cache(maxsize=1)
+def _shared_graph_db(db_config: frozenset) -> MarketGraphDB:
+    """Return one MarketGraphDB per connection config so tools share a driver pool"""
+    return MarketGraphDB(**dict(db_config))
+
+class PriceSeries(NamedTuple):
+    """Struct-of-arrays view of a price history"""
+    dates: np.ndarray
+    closes: np.ndarray
+    volumes: np.ndarray
+
+def _to_price_series(records: List[Dict]) -> PriceSeries:
+    """Convert get_price_history records into columnar arrays once"""
+    count = len(records)
+    return PriceSeries(
+        dates=np.array([r['date'] for r in records], dtype=object),
+        closes=np.fromiter((r['price'] for r in records), dtype=np.float64, count=count),
+        volumes=np.fromiter((r['volume'] for r in records), dtype=np.int64, count=count)
+    )
+
+def _pearson(a: np.ndarray, b: np.ndarray) -> float:
+    """Pearson coefficient of two equal-length float64 arrays
+
+    Computed directly from mean-centered dot products rather than through
+    np.corrcoef, which builds a full covariance matrix for a single scalar.
+    """
+    ac = a - a.mean()
+    bc = b - b.mean()
+    denominator = np.linalg.norm(ac) * np.linalg.norm(bc)
+    return float(ac @ bc / denominator) if denominator != 0 else 0.0
+
+def _daily_returns(closes: np.ndarray) -> np.ndarray:
+    """Simple returns between consecutive closes"""
+    return closes[1:] / closes[:-1] - 1
+
+def _align(dates1: np.ndarray, values1: np.ndarray,
+           dates2: np.ndarray, values2: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Keep only the dates present in both series, in date order"""
+    dates, idx1, idx2 = np.intersect1d(dates1, dates2, assume_unique=True, return_indices=True)
+    return dates, values1[idx1], values2[idx2]
+
+# Parsed, type-validated parameters for each tool command
+class _Command(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+class PriceHistoryCmd(_Command):
+    ticker: str
+    days: int = Field(default=30, gt=0)
+
+class CorrelationCmd(_Command):
+    symbol1: str
+    symbol2: str
+    timeframe: str = "1y"
+
+class RollingCorrelationCmd(_Command):
+    symbol1: str
+    symbol2: str
+    window: int = Field(default=30, ge=2)
+    timeframe: str = "1y"
+
+class SupplyChainCmd(_Command):
+    ticker: str
+    depth: int = Field(default=2, gt=0, le=4)  # same bound as get_entity_relationships
+
+class NewsSentimentCmd(_Command):
+    ticker: str
+    days: int = Field(default=30, gt=0)
+
+class EventImpactCmd(_Command):
+    ticker: str = Field(pattern=r"^[A-Za-z]+$")
+    event_date: date
+    window: int = Field(default=5, gt=0)
+
+    @field_validator("event_date", mode="before")
+    @classmethod
+    def _parse_event_date(cls, value):
+        # Accept only YYYY-MM-DD; lax date parsing would also take unix timestamps
+        if isinstance(value, date):
+            return value
+        try:
+            return datetime.strptime(str(value), "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError(f"Invalid date format: {value}. Use YYYY-MM-DD")
+
 class MarketQueryTool(BaseTool):
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -34,6 +129,10 @@ class MarketQueryTool(BaseTool):
     5) news_sentiment_correlation: ticker=<str>, days=<int>
        Analyze correlation between news sentiment and price movements
        Example: 'news_sentiment_correlation: ticker=AAPL, days=30'
+
+    6) rolling_correlation: symbol1=<str>, symbol2=<str>, window=<int>
+       Track how the daily-return correlation between two assets changes over sliding windows
+       Example: 'rolling_correlation: symbol1=AAPL, symbol2=QCOM, window=30'
     """
     
     # Define all class fields with Pydantic
@@ -43,14 +142,13 @@ class MarketQueryTool(BaseTool):
 
     def __init__(self, db_config: dict):
         super().__init__()
-        self.graph_db = MarketGraphDB(**db_config)
+        self.graph_db = _shared_graph_db(frozenset(db_config.items()))
         
         # Add error handling for env vars
         if not all([os.getenv("NEO4J_URI"), os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD")]):
             raise EnvironmentError("Missing required Neo4j environment variables")
 
-        # Add basic logging
-        logging.basicConfig(level=logging.INFO)
+        # Logging handlers are configured by the application entry point
         self.logger = logging.getLogger(__name__)
 
     def _run(self, command: str) -> str:
@@ -59,131 +157,166 @@ class MarketQueryTool(BaseTool):
             'timestamp': datetime.now().isoformat()
         })
 
-        cmd = command.strip().lower()
+        match = _CMD_RE.match(command)
+        if not match:
+            return f"Error executing query: unrecognized command: {command}"
+        name, payload = match.groups()
+        
+        # Only the command name is case-insensitive; tickers are stored upper-case
+        entry = self._COMMANDS.get(name.lower())
+        if entry is None:
+            return f"Error executing query: unrecognized command: {name}"
+        model, handler, formatter = entry
+        parse = self._parse_params
         
         try:
-            if cmd.startswith("price_history:"):
-                params = self._parse_params(cmd.split(":", 1)[1])
-                result = self.graph_db.get_price_history(
-                    params.get("ticker"),
-                    int(params.get("days", 30))
-                )
-                return self._format_price_history(result)
-                
-            elif cmd.startswith("correlation_analysis:"):
-                params = self._parse_params(cmd.split(":", 1)[1])
-                result = self._analyze_correlation(
-                    params.get("symbol1"),
-                    params.get("symbol2"),
-                    params.get("timeframe", "1y")
-                )
-                return self._format_correlation(result)
-
-            elif cmd.startswith("supply_chain_impact:"):
-                params = self._parse_params(cmd.split(":", 1)[1])
-                result = self._analyze_supply_chain(
-                    params.get("ticker"),
-                    int(params.get("depth", 2))
-                )
-                return self._format_supply_chain(result)
-
-            elif cmd.startswith("news_sentiment_correlation:"):
-                params = self._parse_params(cmd.split(":", 1)[1])
-                result = self._analyze_news_sentiment(
-                    params.get("ticker"),
-                    int(params.get("days", 30))
-                )
-                return self._format_news_sentiment(result)
-
-            elif cmd.startswith("event_impact:"):
-                params = self._parse_params(cmd.split(":", 1)[1])
-                result = self._analyze_event_impact(
-                    params.get("ticker"),
-                    params.get("event_date"),
-                    int(params.get("window", 5))
-                )
-                return self._format_event_impact(result)
-                
+            cmd = model.model_validate(parse(payload))
+        except ValidationError as e:
+            errors = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc']) or 'params'}: {err['msg']}"
+                for err in e.errors()
+            )
+            return f"Invalid parameters for {name}: {errors}"
+
+        try:
+            return formatter(handler(self, cmd))
         except Exception as e:
             return f"Error executing query: {str(e)}"
 
+    def _handle_price_history(self, cmd: PriceHistoryCmd) -> PriceSeries:
+        return _to_price_series(self.graph_db.get_price_history(cmd.ticker, cmd.days))
+
+    def _handle_correlation_analysis(self, cmd: CorrelationCmd) -> List[Dict]:
+        return self._analyze_correlation(cmd.symbol1, cmd.symbol2, cmd.timeframe)
+
+    def _handle_rolling_correlation(self, cmd: RollingCorrelationCmd) -> List[Dict]:
+        return self._analyze_rolling_correlation(cmd.symbol1, cmd.symbol2, cmd.window, cmd.timeframe)
+
+    def _handle_supply_chain_impact(self, cmd: SupplyChainCmd) -> List[Dict]:
+        return self._analyze_supply_chain(cmd.ticker, cmd.depth)
+
+    def _handle_news_sentiment_correlation(self, cmd: NewsSentimentCmd) -> List[Dict]:
+        return self._analyze_news_sentiment(cmd.ticker, cmd.days)
+
+    def _handle_event_impact(self, cmd: EventImpactCmd) -> List[Dict]:
+        return self._analyze_event_impact(cmd.ticker, cmd.event_date, cmd.window)
+
     def _parse_params(self, param_str: str) -> Dict:
         """Parse parameters from command string"""
-        params = {}
-        for param in param_str.split(','):
-            if '=' in param:
-                key, value = param.split('=')
-                params[key.strip()] = value.strip()
-        return params
-
-    def _validate_params(self, params: Dict, required: List[str]) -> None:
-        """Validate required parameters are present and correctly formatted"""
-        for param in required:
-            if param not in params:
-                raise ValueError(f"Missing required parameter: {param}")
-            
-            # Validate specific parameter formats
-            if param == "ticker":
-                if not isinstance(params[param], str) or not params[param].isalpha():
-                    raise ValueError(f"Invalid ticker format: {params[param]}")
-                
-            elif param == "event_date":
-                try:
-                    datetime.strptime(params[param], "%Y-%m-%d")
-                except ValueError:
-                    raise ValueError(f"Invalid date format: {params[param]}. Use YYYY-MM-DD")
-
-    def _format_price_history(self, data: List[Dict]) -> str:
+        return {m.group(1): m.group(2).strip() for m in _PARAM_RE.finditer(param_str)}
+
+    @staticmethod
+    def _format_price_history(data: PriceSeries) -> str:
         """Format price history data for agent consumption"""
-        return "\n".join([
-            f"Date: {d['date']}, Close: ${d['close']:.2f}, Volume: {d['volume']:,}"
-            for d in data
-        ])
+        return "\n".join(
+            f"Date: {d}, Close: ${c:.2f}, Volume: {v:,}"
+            for d, c, v in zip(data.dates, data.closes.tolist(), data.volumes.tolist())
+        )
 
-    def _format_correlation(self, data: List[Dict]) -> str:
+    @staticmethod
+    def _format_correlation(data: List[Dict]) -> str:
         """Format correlation analysis data for agent consumption"""
-        return "\n".join([
+        return "\n".join(
             f"Ticker: {d['ticker']}, Correlation: {d['correlation_coefficient']:.2f}"
             for d in data
-        ])
+        )
 
     def _analyze_correlation(self, symbol1: str, symbol2: str, timeframe: str) -> List[Dict]:
-        """Analyze correlation between two assets with advanced metrics"""
-        # Use interface method instead of direct query
-        prices1 = self.graph_db.get_correlation_data(symbol1, timeframe)
-        prices2 = self.graph_db.get_correlation_data(symbol2, timeframe)
+        """Analyze correlation between the daily returns of two assets"""
+        # Prefer the coefficient precomputed at ingest time
+        stored = self.graph_db.get_precomputed_correlation(symbol1, symbol2)
+        if stored is not None:
+            return [{
+                'ticker': symbol2,
+                'correlation_coefficient': float(stored['coef']),
+                'start': stored['start'],
+                'end': stored['end'],
+                'data_points': stored['data_points']
+            }]
+
+        (dates1, prices1), (dates2, prices2) = self._load_price_pair(symbol1, symbol2, timeframe)
         
-        if not prices1 or not prices2:
+        # Same as ingest: returns over each ticker's own consecutive trading
+        # days, compared on the dates both have a return for
+        dates, returns1, returns2 = _align(dates1[1:], _daily_returns(prices1),
+                                           dates2[1:], _daily_returns(prices2))
+        if len(dates) < 2:
             return []
         
         # Calculate correlation
-        prices1_arr = np.array([p['price'] for p in prices1])
-        prices2_arr = np.array([p['price'] for p in prices2])
-        correlation = np.corrcoef(prices1_arr, prices2_arr)[0,1]
+        correlation = _pearson(returns1, returns2)
         
         return [{
             'ticker': symbol2,
             'correlation_coefficient': float(correlation),
-            'period': timeframe,
-            'data_points': len(prices1)
+            'start': dates[0],
+            'end': dates[-1],
+            'data_points': len(dates)
+        }]
+
+    def _analyze_rolling_correlation(self, symbol1: str, symbol2: str, window: int,
+                                     timeframe: str = "1y") -> List[Dict]:
+        """Analyze how the daily-return correlation between two assets evolves over sliding windows"""
+        (dates1, prices1), (dates2, prices2) = self._load_price_pair(symbol1, symbol2, timeframe)
+        # Same returns and alignment as _analyze_correlation, so each window
+        # measures the quantity correlation_analysis reports
+        _, returns1, returns2 = _align(dates1[1:], _daily_returns(prices1),
+                                       dates2[1:], _daily_returns(prices2))
+        
+        if len(returns1) < max(window, 2):
+            return []
+        
+        rolling = rolling_pearson(returns1, returns2, window)
+        
+        return [{
+            'ticker': symbol2,
+            'window': window,
+            'latest': float(rolling[-1]),
+            'mean': float(rolling.mean()),
+            'min': float(rolling.min()),
+            'max': float(rolling.max()),
+            'windows': len(rolling)
         }]
 
+    def _load_price_pair(self, symbol1: str, symbol2: str,
+                         timeframe: str) -> Tuple[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+        """Load two (dates, closes) series as arrays"""
+        # Fetch both series concurrently; the driver releases the GIL on I/O
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            future1 = executor.submit(self.graph_db.get_correlation_series, symbol1, timeframe)
+            future2 = executor.submit(self.graph_db.get_correlation_series, symbol2, timeframe)
+            return future1.result(), future2.result()
+
+    @staticmethod
+    def _format_rolling_correlation(data: List[Dict]) -> str:
+        """Format rolling correlation analysis data for agent consumption"""
+        return "\n".join(
+            f"Ticker: {d['ticker']}, Window: {d['window']}, Latest: {d['latest']:.2f}, "
+            f"Mean: {d['mean']:.2f}, Range: {d['min']:.2f} to {d['max']:.2f}"
+            for d in data
+        )
+
     def _analyze_supply_chain(self, ticker: str, depth: int) -> Dict:
         """Analyze supply chain relationships and impacts"""
         suppliers = self.graph_db.get_supply_chain(ticker)
         
+        # A supplier can appear under several relationship paths; fetch and
+        # compute each ticker's recent price impact once, in a single round-trip
+        tickers = list(dict.fromkeys(supplier['ticker'] for supplier in suppliers))
+        histories = self.graph_db.get_price_history_batch(tickers, days=30)
+        impacts = {
+            t: self._calculate_price_change(_to_price_series(histories[t]))
+            for t in tickers
+        }
+        
         result = []
         for supplier in suppliers:
-            # Get recent price impact
-            price_history = self.graph_db.get_price_history(supplier['ticker'], days=30)
-            price_change = self._calculate_price_change(price_history)
-            
             result.append({
                 'ticker': supplier['ticker'],
                 'name': supplier['name'],
-                'impact': price_change,
+                'impact': impacts[supplier['ticker']],
                 'relationship_strength': supplier['relationship_strength'],
-                'relationship_type': supplier['relationship_types'][0]
+                'relationship_type': next(iter(supplier['relationship_types'] or []), None)
             })
         
         return result
@@ -194,96 +327,96 @@ class MarketQueryTool(BaseTool):
         data = self.graph_db.get_news_correlation(ticker, days)
         
         result = []
-        if data['news'] and data['prices']:
-            avg_sentiment = sum(n['sentiment'] for n in data['news']) / len(data['news'])
-            price_change = self._calculate_price_change(data['prices'])
+        # Articles without a score don't count toward either average
+        news = [n for n in data['news'] if n['sentiment'] is not None]
+        if news and data['prices']:
+            # Sentiment scores are low precision, so float32 is sufficient
+            sentiment = np.fromiter((n['sentiment'] for n in news), dtype=np.float32, count=len(news))
+            avg_sentiment = float(sentiment.mean())
+            # News is ordered oldest first; an article's weight halves every
+            # _SENTIMENT_HALF_LIFE newer articles
+            age = np.arange(len(sentiment) - 1, -1, -1, dtype=np.float32)
+            weights = np.exp2(-age / _SENTIMENT_HALF_LIFE)
+            weighted_sentiment = float((sentiment * weights).sum() / weights.sum())
+            price_change = self._calculate_price_change(_to_price_series(data['prices']))
             
             result.append({
                 'ticker': ticker,
                 'sentiment': avg_sentiment,
+                'weighted_sentiment': weighted_sentiment,
                 'price_change': price_change,
-                'news_count': len(data['news'])
+                'news_count': len(news)
             })
         
         return result
 
     def _calculate_correlation(self, series1: List, series2: List) -> float:
         """Helper method to calculate correlation between two price series"""
-        # Simple correlation calculation
-        # In production, you'd want to use numpy/pandas for this
-        x = [p[1] for p in series1]
-        y = [p[1] for p in series2]
-        
-        mean_x = sum(x) / len(x)
-        mean_y = sum(y) / len(y)
+        x = np.fromiter((p[1] for p in series1), dtype=np.float64, count=len(series1))
+        y = np.fromiter((p[1] for p in series2), dtype=np.float64, count=len(series2))
         
-        numerator = sum((xi - mean_x) * (yi - mean_y) for xi, yi in zip(x, y))
-        denominator = (
-            (sum((xi - mean_x) ** 2 for xi in x) * 
-             sum((yi - mean_y) ** 2 for yi in y)) ** 0.5
-        )
-        
-        return numerator / denominator if denominator != 0 else 0
+        return _pearson(x, y)
 
-    def _calculate_price_change(self, price_history: List[Dict]) -> float:
+    def _calculate_price_change(self, prices: PriceSeries) -> float:
         """Helper method to calculate price change percentage"""
-        if not price_history or len(price_history) < 2:
+        if len(prices.closes) < 2:
             return 0.0
         
-        start_price = price_history[0]['close']
-        end_price = price_history[-1]['close']
-        
-        return ((end_price - start_price) / start_price) * 100
+        return float((prices.closes[-1] / prices.closes[0] - 1) * 100)
 
-    def _format_supply_chain(self, data: Dict) -> str:
+    @staticmethod
+    def _format_supply_chain(data: Dict) -> str:
         """Format supply chain analysis data for agent consumption"""
-        return "\n".join([
+        return "\n".join(
             f"Ticker: {d['ticker']}, Impact: {d['impact']:.2f}"
             for d in data
-        ])
+        )
 
-    def _format_news_sentiment(self, data: Dict) -> str:
+    @staticmethod
+    def _format_news_sentiment(data: Dict) -> str:
         """Format news sentiment analysis data for agent consumption"""
-        return "\n".join([
-            f"Ticker: {d['ticker']}, Sentiment: {d['sentiment']:.2f}"
+        return "\n".join(
+            f"Ticker: {d['ticker']}, Sentiment: {d['sentiment']:.2f}, "
+            f"Recency-weighted Sentiment: {d['weighted_sentiment']:.2f}"
             for d in data
-        ])
+        )
 
-    def _analyze_event_impact(self, ticker: str, event_date: str, window: int) -> List[Dict]:
+    def _analyze_event_impact(self, ticker: str, event_date: Union[str, date], window: int) -> List[Dict]:
         """Analyze price movement around an event"""
-        from datetime import datetime, timedelta
+        if isinstance(event_date, str):
+            event_date = datetime.strptime(event_date, "%Y-%m-%d").date()
         
-        # Calculate date range
-        event_dt = datetime.strptime(event_date, "%Y-%m-%d")
-        start_date = (event_dt - timedelta(days=window)).strftime("%Y-%m-%d")
-        end_date = (event_dt + timedelta(days=window)).strftime("%Y-%m-%d")
+        # Calculate date range; the driver sends dates to Neo4j as native Date values
+        start_date = event_date - timedelta(days=window)
+        end_date = event_date + timedelta(days=window)
         
         # Get prices using date range
         prices = self.graph_db.get_price_history(
             ticker,
             start_date=start_date,
-            end_date=end_date
+            end_date=end_date,
+            event_date=event_date
         )
         
         if not prices:
             return []
         
-        # Find event index
-        event_idx = next((i for i, p in enumerate(prices) 
-                         if p['date'].strftime("%Y-%m-%d") == event_date), None)
+        # Find event index; Neo4j flags the event row and returns rows in date order
+        event_idx = next((i for i, p in enumerate(prices) if p['is_event']), None)
                          
         if event_idx is None:
             return []
         
-        # Calculate pre/post metrics
-        pre_prices = [p['price'] for p in prices[:event_idx]]
-        post_prices = [p['price'] for p in prices[event_idx+1:]]
+        # Calculate pre/post metrics on arrays loaded once
+        series = _to_price_series(prices)
+        pre_closes, post_closes = series.closes[:event_idx], series.closes[event_idx+1:]
+        pre_volumes, post_volumes = series.volumes[:event_idx], series.volumes[event_idx+1:]
         
-        pre_change = ((pre_prices[-1] - pre_prices[0]) / pre_prices[0]) * 100 if pre_prices else 0
-        post_change = ((post_prices[-1] - post_prices[0]) / post_prices[0]) * 100 if post_prices else 0
+        pre_change = float((pre_closes[-1] - pre_closes[0]) / pre_closes[0] * 100) if pre_closes.size else 0
+        post_change = float((post_closes[-1] - post_closes[0]) / post_closes[0] * 100) if post_closes.size else 0
         
-        pre_vol = sum(p['volume'] for p in prices[:event_idx]) / len(prices[:event_idx]) if prices[:event_idx] else 0
-        post_vol = sum(p['volume'] for p in prices[event_idx+1:]) / len(prices[event_idx+1:]) if prices[event_idx+1:] else 0
+        pre_vol = float(pre_volumes.mean()) if pre_volumes.size else 0
+        post_vol = float(post_volumes.mean()) if post_volumes.size else 0
         
         return [{
             'ticker': ticker,
@@ -293,12 +426,24 @@ class MarketQueryTool(BaseTool):
             'volume_change': post_vol - pre_vol
         }]
 
-    def _format_event_impact(self, data: List[Dict]) -> str:
+    @staticmethod
+    def _format_event_impact(data: List[Dict]) -> str:
         """Format event impact analysis data"""
-        return "\n".join([
+        return "\n".join(
             f"Event Date: {d['event_date']}\n"
             f"Pre-event Change: {d['pre_event_change']:.2f}%\n"
             f"Post-event Change: {d['post_event_change']:.2f}%\n"
             f"Volume Change: {d['volume_change']:,.0f}"
             for d in data
-        ]) 
\ No newline at end of file
+        )
+
+    # command name -> (params model, handler, formatter), built once with the
+    # class; formatters are staticmethods and take only the handler's result
+    _COMMANDS: ClassVar[Dict[str, Tuple[Type[BaseModel], Callable, Callable]]] = {
+        "price_history": (PriceHistoryCmd, _handle_price_history, _format_price_history),
+        "correlation_analysis": (CorrelationCmd, _handle_correlation_analysis, _format_correlation),
+        "rolling_correlation": (RollingCorrelationCmd, _handle_rolling_correlation, _format_rolling_correlation),
+        "supply_chain_impact": (SupplyChainCmd, _handle_supply_chain_impact, _format_supply_chain),
+        "news_sentiment_correlation": (NewsSentimentCmd, _handle_news_sentiment_correlation, _format_news_sentiment),
+        "event_impact": (EventImpactCmd, _handle_event_impact, _format_event_impact),
+    }
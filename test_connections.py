@@ -1,52 +1,100 @@
 from neo4j import GraphDatabase
 from newsapi import NewsApiClient
 from sec_api import QueryApi
+from knowledge_graph.graph_interface import MarketGraphDB
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import atexit
+import functools
 from dotenv import load_dotenv
 
-def test_connections():
-    load_dotenv()
-    
-    print("\n=== Testing API Connections ===\n")
+# Clients are created once per process and reused across repeated checks
+@functools.lru_cache(maxsize=1)
+def get_driver():
+    driver = GraphDatabase.driver(
+        os.getenv("NEO4J_URI"),
+        auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
+    )
+    atexit.register(driver.close)
+    return driver
+
+@functools.lru_cache(maxsize=1)
+def get_news_api():
+    return NewsApiClient(api_key=os.getenv("NEWS_API_KEY"))
 
-    # 1. Test Neo4j
-    print("Testing Neo4j connection...")
+@functools.lru_cache(maxsize=1)
+def get_sec_api():
+    return QueryApi(api_key=os.getenv("SEC_API_KEY"))
+
+@functools.lru_cache(maxsize=1)
+def get_graph_db():
+    db = MarketGraphDB(
+        uri=os.getenv("NEO4J_URI"),
+        user=os.getenv("NEO4J_USER"),
+        password=os.getenv("NEO4J_PASSWORD")
+    )
+    atexit.register(db.close)
+    return db
+
+def _check_neo4j():
     try:
-        driver = GraphDatabase.driver(
-            os.getenv("NEO4J_URI"),
-            auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"))
-        )
-        driver.verify_connectivity()
-        print("✅ Neo4j connection successful!")
+        get_driver().verify_connectivity()
+        return "Neo4j", True, None
     except Exception as e:
-        print(f"❌ Neo4j connection failed: {str(e)}")
-    finally:
-        if 'driver' in locals():
-            driver.close()
+        return "Neo4j", False, e
 
-    # 2. Test NewsAPI
-    print("\nTesting NewsAPI connection...")
+def _check_newsapi():
     try:
-        news_api = NewsApiClient(api_key=os.getenv("NEWS_API_KEY"))
         # Make a simple test request
-        news_api.get_everything(q="AAPL", page_size=1)
-        print("✅ NewsAPI connection successful!")
+        get_news_api().get_everything(q="AAPL", page_size=1)
+        return "NewsAPI", True, None
     except Exception as e:
-        print(f"❌ NewsAPI connection failed: {str(e)}")
+        return "NewsAPI", False, e
 
-    # 3. Test SEC API
-    print("\nTesting SEC API connection...")
+def _check_sec():
     try:
-        sec_api = QueryApi(api_key=os.getenv("SEC_API_KEY"))
         # Make a simple test request
-        sec_api.get_filings({
+        get_sec_api().get_filings({
             "query": {"query_string": {"query": "ticker:AAPL"}},
             "from": "0",
             "size": "1"
         })
-        print("✅ SEC API connection successful!")
+        return "SEC API", True, None
     except Exception as e:
-        print(f"❌ SEC API connection failed: {str(e)}")
+        return "SEC API", False, e
+
+def _check_entity_relationships():
+    try:
+        db = get_graph_db()
+        # Depth is formatted into the Cypher, so out-of-range values must be
+        # rejected before anything is sent
+        try:
+            db.get_entity_relationships(-1, depth=5)
+            raise AssertionError("depth=5 was not rejected")
+        except ValueError:
+            pass
+        # The deepest allowed traversal must be valid Cypher; no node has id -1
+        db.get_entity_relationships(-1, depth=4)
+        return "Entity relationships query", True, None
+    except Exception as e:
+        return "Entity relationships query", False, e
+
+def test_connections():
+    load_dotenv()
+
+    print("\n=== Testing API Connections ===\n")
+
+    # The checks are independent network round-trips, so run them together
+    # and report each as it finishes
+    checks = [_check_neo4j, _check_newsapi, _check_sec, _check_entity_relationships]
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = [executor.submit(check) for check in checks]
+        for future in as_completed(futures):
+            label, ok, err = future.result()
+            if ok:
+                print(f"✅ {label} connection successful!")
+            else:
+                print(f"❌ {label} connection failed: {str(err)}")
 
 if __name__ == "__main__":
-    test_connections() 
\ No newline at end of file
+    test_connections()
\ No newline at end of file